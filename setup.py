@@ -18,7 +18,7 @@ setup(
     url="https://github.com/stephrdev/conrad-relaycard/",
     packages=find_packages("src"),
     package_dir={"": "src"},
-    install_requires=["pyserial"],
+    install_requires=["pyserial", "numpy"],
     entry_points={
         "console_scripts": ["conrad-relaycard=conrad_relaycard.cli:main"],
     },
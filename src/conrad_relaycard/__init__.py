@@ -1,3 +1,6 @@
 from .card import RelayCard  # noqa: F401
+from .chain import ChainState  # noqa: F401
 from .exceptions import RelayCardError  # noqa: F401
+from .journal import StateJournal  # noqa: F401
+from .options import RelayOptions  # noqa: F401
 from .state import RelayState  # noqa: F401
@@ -4,18 +4,39 @@ import logging
 import time
 from contextlib import suppress
 
+import numpy as np
+import numpy.typing as npt
 import serial
 
+from .chain import BROADCAST_ADDRESS, ChainState
 from .constants import ComCodes, CommandCodes
 from .exceptions import RelayCardError
 from .frame import RequestFrame, ResponseFrame
+from .journal import StateJournal
+from .options import RelayOptions
 from .state import RelayState
 
+BROADCAST_COMMANDS = (CommandCodes.SETPORT, CommandCodes.SETSINGLE, CommandCodes.DELSINGLE, CommandCodes.TOGGLE)
+
+
+def _changed_state(command: CommandCodes, state: int, data: int) -> int:
+    if command == CommandCodes.SETPORT:
+        return data
+    if command == CommandCodes.SETSINGLE:
+        return state | data
+    if command == CommandCodes.DELSINGLE:
+        return state & ~data & 0xFF
+    if command == CommandCodes.TOGGLE:
+        return state ^ data
+    raise RelayCardError(f"Wrong port command {command}")
+
 
 class RelayCard:
-    def __init__(self, port: str):
+    def __init__(self, port: str, journal: StateJournal | None = None):
         self.port: str = port
         self.card_count: int = 0
+        self.journal: StateJournal | None = journal
+        self._options: dict[int, RelayOptions] = {}
 
     @property
     def is_initialized(self) -> bool:
@@ -25,6 +46,11 @@ class RelayCard:
         with suppress(Exception):
             self._serial_port.close()
 
+    def _try_reopen(self) -> None:
+        with suppress(Exception):
+            if not self._serial_port.is_open:
+                self._serial_port.open()
+
     def _get_serial_port(self, port: str | None = None) -> serial.Serial:
         if not hasattr(self, "_serial_port"):
             logging.debug(f"Opening serial port {port or self.port}")
@@ -81,10 +107,11 @@ class RelayCard:
             raise RelayCardError(f"Retry #{_i}: {error_log}")
         return response
 
-    def _send_frame(self, frame: RequestFrame) -> ResponseFrame:
+    def _write_frame(self, frame: RequestFrame, close_on_error: bool = True) -> serial.Serial:
         logging.info(f"Sending frame: {frame}")
         if not self.is_initialized:
-            self._try_close()
+            if close_on_error:
+                self._try_close()
             raise RelayCardError("Initialize serial connection before sending")
 
         ser = self._get_serial_port()
@@ -93,9 +120,15 @@ class RelayCard:
         logging.debug(f"Sending bytes: {repr(out_bytes)}")
 
         if ser.write(out_bytes) != 4:
-            self._try_close()
+            if close_on_error:
+                self._try_close()
             raise RelayCardError(f"Wrong length of send bytes: {out_bytes}. Expected 4")
 
+        return ser
+
+    def _send_frame(self, frame: RequestFrame, close_on_error: bool = True) -> ResponseFrame:
+        ser = self._write_frame(frame, close_on_error)
+
         in_bytes = ser.read(4)
         logging.debug(f"Received bytes: {repr(bytearray(in_bytes))}")
 
@@ -107,8 +140,22 @@ class RelayCard:
         logging.info(f"Received frame: {response}")
         return response
 
+    def send_once(self, command: CommandCodes, address: int, data: int = 0) -> ResponseFrame:
+        """
+        Send a single frame without retries and return the raw response.
+
+        Unlike the other commands, errors leave the serial port open, so the
+        next frame can be sent right away (used by probe()).
+        """
+        if not (0 < address <= self.card_count):
+            raise RelayCardError(f"Wrong relay address {address}. Expected 1-{self.card_count}")
+
+        return self._send_frame(RequestFrame(command, address, data), close_on_error=False)
+
     def setup(self) -> bool:
         ser = self._get_serial_port()
+        self._options = {}
+        previous_count = self.card_count
 
         for _ in range(0, 4):
             logging.debug("Sending setup frame")
@@ -145,11 +192,75 @@ class RelayCard:
         ser.reset_input_buffer()
         ser.reset_output_buffer()
 
+        if self.journal is not None and previous_count and self.card_count != previous_count and self.is_initialized:
+            logging.warning(f"Card count changed from {previous_count} to {self.card_count}, restoring port states")
+            try:
+                self.restore()
+            except RelayCardError as e:
+                logging.error(f"Restoring port states failed: {e}")
+                self._try_reopen()
+
         return self.is_initialized
 
+    def _record(self, address: int, command: CommandCodes, data: int, reply: RelayState | None = None) -> None:
+        """
+        Journal the state a port command is meant to leave the card in.
+
+        The intent is derived from the journaled state, not from the card reply,
+        so a write to a card which just lost its state keeps the old intent.
+        Without a journaled state the reply is recorded instead.
+        """
+        if self.journal is None:
+            return
+
+        desired = self.journal.get_state(address)
+        if command == CommandCodes.SETPORT:
+            self.journal.record(address, RelayState(data))
+        elif desired is not None:
+            self.journal.record(address, RelayState(_changed_state(command, desired.to_byte(), data)))
+        elif reply is not None:
+            self.journal.record(address, reply)
+
+    def restore(self) -> list[int]:
+        """
+        Re-apply the journaled port states to all cards which differ from it.
+
+        Returns the addresses which got a SETPORT frame.
+        """
+        if self.journal is None or not self.is_initialized:
+            return []
+
+        current = ChainState(self.card_count)
+        target = ChainState(self.card_count)
+        for address, desired in self.journal.states().items():
+            if address > self.card_count:
+                continue
+            current.set_state(address, RelayState(self._execute_retry(ComCodes.GETPORT, address).data))
+            target.set_state(address, desired)
+
+        frames = current.to_frames(target, broadcast=False)
+        for frame in frames:
+            logging.info(f"Restoring port states of card {frame.address}")
+            self._execute_retry(ComCodes.SETPORT, frame.address, frame.data)
+
+        return [frame.address for frame in frames]
+
     def get_ports(self, address: int) -> RelayState:
         response = self._execute_retry(ComCodes.GETPORT, address)
-        return RelayState(response.data)
+        state = RelayState(response.data)
+
+        if self.journal is not None and response.data == 0:
+            desired = self.journal.get_state(address)
+            if desired is not None and desired.to_byte() != 0:
+                # all relays off although others were requested, the card was reset
+                logging.warning(f"Card {address} lost its port states, restoring {desired}")
+                try:
+                    state = self.set_ports(address, desired)
+                except RelayCardError as e:
+                    logging.error(f"Restoring port states of card {address} failed: {e}")
+                    self._try_reopen()
+
+        return state
 
     def get_port(self, address: int, port: int) -> bool:
         return self.get_ports(address).get_port(port)
@@ -160,18 +271,21 @@ class RelayCard:
             address,
             new_state.to_byte(),
         )
+        self._record(address, CommandCodes.SETPORT, new_state.to_byte())
         return RelayState(response.data)
 
     def set_port(self, address: int, port: int, port_state: int) -> RelayState:
         new_state = RelayState()
         new_state.set_port(port, True)
 
+        com_codes = ComCodes.SETSINGLE if port_state else ComCodes.DELSINGLE
         response = self._execute_retry(
-            ComCodes.SETSINGLE if port_state else ComCodes.DELSINGLE,
+            com_codes,
             address,
             new_state.to_byte(),
         )
 
+        self._record(address, com_codes.command_code, new_state.to_byte(), RelayState(response.data))
         return RelayState(response.data)
 
     def toggle_ports(self, address: int, toggle_state: RelayState) -> RelayState:
@@ -180,6 +294,7 @@ class RelayCard:
             address,
             toggle_state.to_byte(),
         )
+        self._record(address, CommandCodes.TOGGLE, toggle_state.to_byte(), RelayState(response.data))
         return RelayState(response.data)
 
     def toggle_port(self, address: int, port: int) -> RelayState:
@@ -191,4 +306,86 @@ class RelayCard:
             address,
             toggle_state.to_byte(),
         )
+        self._record(address, CommandCodes.TOGGLE, toggle_state.to_byte(), RelayState(response.data))
         return RelayState(response.data)
+
+    def get_options(self, address: int, refresh: bool = False) -> RelayOptions:
+        if refresh or address not in self._options:
+            response = self._execute_retry(ComCodes.GETOPTION, address)
+            self._options[address] = RelayOptions.from_byte(response.data)
+        return self._options[address]
+
+    def set_options(self, address: int, options: RelayOptions) -> RelayOptions:
+        self._execute_retry(
+            ComCodes.SETOPTION,
+            address,
+            options.to_byte(),
+        )
+        self._options[address] = options
+        return options
+
+    def load_options(self) -> dict[int, RelayOptions]:
+        """Read options of all cards not cached since the last setup()."""
+        for address in range(1, self.card_count + 1):
+            self.get_options(address)
+        return self._options
+
+    def broadcast_receivers(self) -> npt.NDArray[np.bool_]:
+        """
+        Cards acting on broadcast frames, one entry per card (index 0 is address 1).
+
+        A card acts on a broadcast if it has broadcasts enabled and no card in
+        front of it in the chain blocks forwarding.
+        """
+        loaded = self.load_options()
+        options = [loaded[i] for i in range(1, self.card_count + 1)]
+        disabled: npt.NDArray[np.bool_] = np.array([o.broadcast_disabled for o in options], dtype=bool)
+        blocked: npt.NDArray[np.bool_] = np.array([o.broadcast_blocked for o in options], dtype=bool)
+
+        # the first card always receives the frame, every later card only if no card in front blocks it
+        blocked_before: npt.NDArray[np.bool_] = np.concatenate(([False], np.logical_or.accumulate(blocked)))[:-1]
+        return ~blocked_before & ~disabled
+
+    def plan_frames(self, current: ChainState, target: ChainState) -> list[RequestFrame]:
+        if current.card_count != self.card_count:
+            raise RelayCardError(f"Wrong card count {current.card_count}. Expected {self.card_count}")
+        return current.to_frames(target, broadcast=self.broadcast_receivers())
+
+    def send_broadcast(self, command: CommandCodes, data: int = 0) -> None:
+        """
+        Send a frame to address 0, executed by every card accepting broadcasts.
+
+        Cards do not answer a broadcast, the frame is passed along the chain
+        and comes back unchanged (or not at all if a card blocks it).
+        """
+        if command not in BROADCAST_COMMANDS:
+            raise RelayCardError(f"Wrong broadcast command {command}. Expected one of {BROADCAST_COMMANDS}")
+
+        frame = RequestFrame(command, BROADCAST_ADDRESS, data)
+        ser = self._write_frame(frame)
+
+        in_bytes = bytearray(ser.read(4))
+        logging.debug(f"Received bytes: {repr(in_bytes)}")
+
+        ser.reset_input_buffer()
+        ser.reset_output_buffer()
+
+        if in_bytes and in_bytes != frame.to_bytes():
+            self._try_close()
+            raise RelayCardError(f"Wrong broadcast echo {in_bytes!r}. Expected {frame.to_bytes()!r}")
+
+    def apply_frames(self, frames: list[RequestFrame]) -> None:
+        """Send frames as planned by plan_frames(), broadcasts included."""
+        receivers: list[int] = []
+        if any(frame.address == BROADCAST_ADDRESS for frame in frames):
+            # read missing options before the first relay is switched
+            receivers = [int(index) + 1 for index in np.flatnonzero(self.broadcast_receivers())]
+
+        for frame in frames:
+            if frame.address == BROADCAST_ADDRESS:
+                self.send_broadcast(frame.command, frame.data)
+                for address in receivers:
+                    self._record(address, frame.command, frame.data)
+            else:
+                response = self._execute_retry(ComCodes[frame.command.name], frame.address, frame.data)
+                self._record(frame.address, frame.command, frame.data, RelayState(response.data))
@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import numpy as np
+import numpy.typing as npt
+
+from .constants import CommandCodes
+from .exceptions import RelayCardError
+from .frame import RequestFrame
+from .state import RelayState
+
+BROADCAST_ADDRESS = 0
+
+
+def _to_bytes(values: npt.NDArray[np.generic], name: str) -> npt.NDArray[np.uint8]:
+    if not np.issubdtype(values.dtype, np.integer):
+        raise RelayCardError(f"Wrong {name} dtype {values.dtype}. Expected integer")
+    if values.size and (values.min() < 0 or values.max() > 255):
+        raise RelayCardError(f"Wrong {name} {values}. Expected 0-255")
+    return values.astype(np.uint8)
+
+
+class ChainState:
+    """
+    Port states of a whole relay card chain, one byte per card address.
+
+    Index 0 of the backing array holds the state of address 1, bit n of each
+    byte is port n (same layout as RelayState.to_byte()).
+    """
+
+    def __init__(self, card_count: int, state: bytes | npt.ArrayLike | None = None):
+        if not (0 < card_count <= 255):
+            raise RelayCardError(f"Wrong card count {card_count}. Expected 1-255")
+
+        if state is None:
+            self._state = np.zeros(card_count, dtype=np.uint8)
+        elif isinstance(state, (bytes, bytearray)):
+            self._state = np.frombuffer(state, dtype=np.uint8).copy()
+        else:
+            self._state = _to_bytes(np.asarray(state), "chain state")
+
+        if self._state.shape != (card_count,):
+            raise RelayCardError(f"Wrong chain state length {self._state.shape}. Expected ({card_count},)")
+
+    def __repr__(self) -> str:
+        return f"<ChainState cards:{self.card_count} state:{self.to_bytes().hex()}>"
+
+    def __len__(self) -> int:
+        return self.card_count
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, ChainState):
+            return NotImplemented
+        return bool(np.array_equal(self._state, other._state))
+
+    @property
+    def card_count(self) -> int:
+        return int(self._state.shape[0])
+
+    @property
+    def ports(self) -> npt.NDArray[np.bool_]:
+        """Port states as bool array (cards x 8), row 0 is address 1."""
+        return np.unpackbits(self._state[:, np.newaxis], axis=1, bitorder="little").astype(bool)
+
+    @classmethod
+    def from_ports(cls, ports: npt.ArrayLike) -> ChainState:
+        values = np.asarray(ports, dtype=bool)
+        if values.ndim != 2 or values.shape[1] != 8:
+            raise RelayCardError(f"Wrong ports shape {values.shape}. Expected (cards, 8)")
+        return cls(values.shape[0], np.packbits(values, axis=1, bitorder="little")[:, 0])
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> ChainState:
+        return cls(len(data), data)
+
+    def to_bytes(self) -> bytes:
+        return self._state.tobytes()
+
+    def copy(self) -> ChainState:
+        return ChainState(self.card_count, self._state)
+
+    def _check_address(self, address: int) -> None:
+        if not (0 < address <= self.card_count):
+            raise RelayCardError(f"Wrong relay address {address}. Expected 1-{self.card_count}")
+
+    def _to_mask(self, mask: npt.ArrayLike) -> npt.NDArray[np.uint8]:
+        values = np.asarray(mask)
+        if values.dtype == bool and values.shape == (self.card_count, 8):
+            return np.packbits(values, axis=1, bitorder="little")[:, 0]
+        if values.shape == (self.card_count,) and values.dtype != bool:
+            return _to_bytes(values, "mask")
+        raise RelayCardError(
+            f"Wrong mask {values.dtype} {values.shape}. "
+            f"Expected integer ({self.card_count},) or bool ({self.card_count}, 8)"
+        )
+
+    def get_state(self, address: int) -> RelayState:
+        self._check_address(address)
+        return RelayState(int(self._state[address - 1]))
+
+    def set_state(self, address: int, new_state: RelayState) -> None:
+        self._check_address(address)
+        self._state[address - 1] = new_state.to_byte()
+
+    def get_ports(self, mask: npt.ArrayLike) -> npt.NDArray[np.bool_]:
+        """
+        Port states limited to mask. Mask is either one byte per card or a
+        bool array (cards x 8). Ports outside the mask are reported as off.
+        """
+        masked = self._state & self._to_mask(mask)
+        return np.unpackbits(masked[:, np.newaxis], axis=1, bitorder="little").astype(bool)
+
+    def set_ports(self, mask: npt.ArrayLike, new_state: bool) -> None:
+        """Switch all ports in mask on or off, other ports stay untouched."""
+        packed = self._to_mask(mask)
+        if new_state:
+            self._state |= packed
+        else:
+            self._state &= ~packed
+
+    def diff(self, other: ChainState) -> npt.NDArray[np.uint8]:
+        """Per card byte mask of ports which differ between both chain states."""
+        if other.card_count != self.card_count:
+            raise RelayCardError(f"Wrong card count {other.card_count}. Expected {self.card_count}")
+        return self._state ^ other._state
+
+    def changed_addresses(self, other: ChainState) -> npt.NDArray[np.intp]:
+        return np.flatnonzero(self.diff(other)) + 1
+
+    def to_frames(self, target: ChainState, broadcast: bool | npt.ArrayLike = True) -> list[RequestFrame]:
+        """
+        Frames to turn this chain state into target.
+
+        Changed cards get one SETPORT frame each. With broadcast enabled, one
+        SETPORT, TOGGLE, SETSINGLE or DELSINGLE frame to address 0 is sent first
+        if it saves frames overall, the cheapest of these candidates wins.
+        Broadcast is either a bool for the whole chain or a bool array with one
+        entry per card, telling which cards act on broadcast frames.
+        """
+        diff = self.diff(target)
+        result = self._state
+        frames = []
+
+        receivers = np.asarray(broadcast, dtype=bool)
+        if receivers.ndim == 0:
+            receivers = np.full(diff.shape, bool(receivers))
+        elif receivers.shape != diff.shape:
+            raise RelayCardError(f"Wrong broadcast shape {receivers.shape}. Expected ({self.card_count},)")
+
+        if receivers.any():
+            best_cost = int(np.count_nonzero(diff))
+            for command, data, changed in self._broadcast_candidates(target, receivers):
+                broadcast_result = np.where(receivers, changed, self._state)
+                cost = 1 + int(np.count_nonzero(broadcast_result != target._state))
+                if cost < best_cost:
+                    best_cost = cost
+                    frames = [RequestFrame(command, BROADCAST_ADDRESS, data)]
+                    result = broadcast_result
+
+        for index in np.flatnonzero(result != target._state):
+            frames.append(RequestFrame(CommandCodes.SETPORT, int(index) + 1, int(target._state[index])))
+
+        return frames
+
+    def _broadcast_candidates(
+        self, target: ChainState, receivers: npt.NDArray[np.bool_]
+    ) -> list[tuple[CommandCodes, int, npt.NDArray[np.uint8]]]:
+        """Best broadcast frame per command with the resulting state of every card."""
+        diff_counts = np.bincount(self.diff(target)[receivers], minlength=256)
+        # unchanged cards are not worth a broadcast toggle
+        diff_counts[0] = 0
+        toggle_data = int(diff_counts.argmax())
+        set_data = int(np.bincount(target._state[receivers], minlength=256).argmax())
+        # ports on resp. off in the target of every card acting on the broadcast
+        single_data = int(np.bitwise_and.reduce(target._state[receivers]))
+        del_data = int(~np.bitwise_or.reduce(target._state[receivers]) & 0xFF)
+
+        return [
+            (CommandCodes.TOGGLE, toggle_data, self._state ^ np.uint8(toggle_data)),
+            (CommandCodes.SETPORT, set_data, np.full_like(self._state, set_data)),
+            (CommandCodes.SETSINGLE, single_data, self._state | np.uint8(single_data)),
+            (CommandCodes.DELSINGLE, del_data, self._state & np.uint8(~del_data & 0xFF)),
+        ]
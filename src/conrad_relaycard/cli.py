@@ -4,6 +4,7 @@ import logging
 
 from .card import RelayCard
 from .exceptions import RelayCardError
+from .probe import PROBE_COMMANDS, probe
 from .state import RelayState
 
 
@@ -43,6 +44,27 @@ def get_opts() -> tuple[argparse.ArgumentParser, argparse.Namespace]:
     do_group.add_argument(
         "--toggle-ports", action="store_true", dest="do_toggle_ports", help="Toggle port states on relay card"
     )
+    do_group.add_argument(
+        "--probe", action="store_true", dest="do_probe", help="Measure round trip times and errors of all cards"
+    )
+
+    probe_group = parser.add_argument_group("probe options")
+    probe_group.add_argument(
+        "--probe-command",
+        dest="probe_commands",
+        action="append",
+        metavar="COMMAND",
+        default=None,
+        choices=tuple(PROBE_COMMANDS),
+        help="Command cycle sent to every card (default: getport, noop)",
+    )
+    probe_group.add_argument(
+        "--probe-count", dest="probe_count", default=None, type=int, help="Frames per card (default: 100)"
+    )
+    probe_group.add_argument(
+        "--probe-duration", dest="probe_duration", default=None, type=float, help="Probe duration in seconds"
+    )
+    probe_group.add_argument("--json", action="store_true", dest="json", help="Output probe results as JSON")
 
     args = parser.parse_args()
 
@@ -67,7 +89,7 @@ def main() -> None:  # noqa C901
 
     card = RelayCard(args.interface)
 
-    if args.do_scan or args.do_get_ports or args.do_set_ports or args.do_toggle_ports:
+    if args.do_scan or args.do_get_ports or args.do_set_ports or args.do_toggle_ports or args.do_probe:
         for _ in range(0, 4):
             if card.setup():
                 break
@@ -122,6 +144,13 @@ def main() -> None:  # noqa C901
 
         card.toggle_ports(args.address, toggle_state)
 
+    elif args.do_probe:
+        if not args.quiet and not args.json:
+            print(f"Probing {card.card_count} relay cards")
+
+        result = probe(card, args.probe_commands, args.probe_count, args.probe_duration)
+        print(result.to_json() if args.json else result.to_table())
+
     else:
         parser.print_help()
 
@@ -1,2 +1,10 @@
 class RelayCardError(Exception):
     pass
+
+
+class ResponseTimeoutError(RelayCardError):
+    pass
+
+
+class ResponseCRCError(RelayCardError):
+    pass
@@ -1,5 +1,5 @@
 from .constants import CommandCodes, ResponseCodes
-from .exceptions import RelayCardError
+from .exceptions import RelayCardError, ResponseCRCError, ResponseTimeoutError
 
 
 class RequestFrame:
@@ -27,7 +27,10 @@ class RequestFrame:
 
 class ResponseFrame:
     def __init__(self, response: bytes) -> None:
-        if len(response) != 4:
+        if len(response) < 4:
+            # the serial read timed out before a whole frame arrived
+            raise ResponseTimeoutError(f"Wrong response length {response!r}. Expected 4")
+        if len(response) > 4:
             raise RelayCardError(f"Wrong response length {response!r}. Expected 4")
         response = bytearray(response)
 
@@ -41,7 +44,7 @@ class ResponseFrame:
         expected_crc = self.command ^ self.address ^ self.data
 
         if response[3] != expected_crc:
-            raise RelayCardError(f"Wrong responce CRC {response[3]}. Expected {expected_crc} ({hex(expected_crc)})")
+            raise ResponseCRCError(f"Wrong responce CRC {response[3]}. Expected {expected_crc} ({hex(expected_crc)})")
         self.crc = response[3]
 
     def __repr__(self) -> str:
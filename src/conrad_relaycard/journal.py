@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import logging
+import os
+
+from .exceptions import RelayCardError
+from .state import RelayState
+
+
+class StateJournal:
+    """
+    Append-only journal of the desired port state per card address.
+
+    Every change is appended as a two byte record (address, state byte). Once
+    compact_every records were appended, the file is rewritten with only the
+    latest record per address.
+    """
+
+    def __init__(self, path: str, compact_every: int = 1000):
+        if compact_every < 1:
+            raise RelayCardError(f"Wrong compact interval {compact_every}. Expected 1+")
+        self.path: str = path
+        self.compact_every: int = compact_every
+        self._states: dict[int, int] = {}
+        self._appended: int = 0
+
+        self._load()
+
+    def __repr__(self) -> str:
+        return f"<StateJournal {self.path} addresses:{len(self._states)}>"
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, "rb") as journal_file:
+            data = journal_file.read()
+
+        if len(data) % 2:
+            # last record was cut off while writing, drop it so new records stay aligned
+            logging.warning(f"Dropping incomplete record at end of journal {self.path}")
+            data = data[:-1]
+            os.truncate(self.path, len(data))
+
+        for i in range(0, len(data), 2):
+            address = data[i]
+            if not (0 < address <= 255):
+                raise RelayCardError(f"Wrong address {address} in journal {self.path}. Expected 1-255")
+            self._states[address] = data[i + 1]
+
+        self._appended = len(data) // 2 - len(self._states)
+
+    def get_state(self, address: int) -> RelayState | None:
+        if address not in self._states:
+            return None
+        return RelayState(self._states[address])
+
+    def states(self) -> dict[int, RelayState]:
+        return {address: RelayState(state) for address, state in sorted(self._states.items())}
+
+    def record(self, address: int, new_state: RelayState) -> None:
+        if not (0 < address <= 255):
+            raise RelayCardError(f"Wrong relay address {address}. Expected 1-255")
+
+        state = new_state.to_byte()
+        if self._states.get(address) == state:
+            return
+
+        self._states[address] = state
+        with open(self.path, "ab") as journal_file:
+            journal_file.write(bytes([address, state]))
+        self._appended += 1
+
+        if self._appended >= self.compact_every:
+            self.compact()
+
+    def compact(self) -> None:
+        logging.debug(f"Compacting journal {self.path}")
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as journal_file:
+            journal_file.write(b"".join(bytes([address, state]) for address, state in sorted(self._states.items())))
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+        os.replace(tmp_path, self.path)
+        self._appended = 0
@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+from .exceptions import RelayCardError
+
+
+@dataclass
+class RelayOptions:
+    """
+    Card options as read with GETOPTION and written with SETOPTION.
+
+    Bit 0 of the data byte disables execution of broadcast frames on the card,
+    bit 1 blocks forwarding of broadcast frames to the following cards.
+    """
+
+    broadcast_disabled: bool = False
+    broadcast_blocked: bool = False
+
+    @classmethod
+    def from_byte(cls, options: int) -> RelayOptions:
+        if not (0 <= options <= 255):
+            raise RelayCardError(f"Wrong options {options}. Expected 0-255")
+        return cls(broadcast_disabled=bool(options & 1), broadcast_blocked=bool(options & 2))
+
+    def to_byte(self) -> int:
+        return int(self.broadcast_disabled) | int(self.broadcast_blocked) << 1
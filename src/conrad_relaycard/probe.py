@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import json
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from itertools import count as counter
+from typing import Any
+
+import numpy as np
+
+from .card import RelayCard
+from .constants import ComCodes
+from .exceptions import RelayCardError, ResponseCRCError, ResponseTimeoutError
+
+PROBE_COMMANDS = {"getport": ComCodes.GETPORT, "noop": ComCodes.NOOP}
+PERCENTILES = (50, 90, 99)
+
+
+@dataclass
+class AddressStats:
+    address: int
+    latencies: list[float] = field(default_factory=list)
+    crc_errors: int = 0
+    timeouts: int = 0
+    errors: int = 0
+
+    @property
+    def frames(self) -> int:
+        return len(self.latencies) + self.crc_errors + self.timeouts + self.errors
+
+    def percentiles(self) -> dict[int, float]:
+        """Round trip time percentiles of successful frames in milliseconds."""
+        if not self.latencies:
+            return {}
+        values = np.percentile(np.array(self.latencies) * 1000, PERCENTILES)
+        return {p: float(values[i]) for i, p in enumerate(PERCENTILES)}
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "address": self.address,
+            "frames": self.frames,
+            "latency_ms": {f"p{p}": round(v, 3) for p, v in self.percentiles().items()},
+            "crc_errors": self.crc_errors,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+        }
+
+
+@dataclass
+class ProbeResult:
+    addresses: dict[int, AddressStats]
+    elapsed: float
+
+    @property
+    def frames(self) -> int:
+        return sum(stats.frames for stats in self.addresses.values())
+
+    @property
+    def throughput(self) -> float:
+        """Frames per second over the whole probe run."""
+        return self.frames / self.elapsed if self.elapsed > 0 else 0.0
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "elapsed": round(self.elapsed, 3),
+                "frames": self.frames,
+                "frames_per_second": round(self.throughput, 2),
+                "addresses": [stats.to_dict() for stats in self.addresses.values()],
+            },
+            indent=2,
+        )
+
+    def to_table(self) -> str:
+        header = ["addr", "frames"] + [f"p{p} ms" for p in PERCENTILES] + ["crc", "timeout", "error"]
+        lines = ["".join(f"{column:>9}" for column in header)]
+        for stats in self.addresses.values():
+            percentiles = stats.percentiles()
+            row = [str(stats.address), str(stats.frames)]
+            row += [f"{percentiles[p]:.2f}" if percentiles else "-" for p in PERCENTILES]
+            row += [str(stats.crc_errors), str(stats.timeouts), str(stats.errors)]
+            lines.append("".join(f"{column:>9}" for column in row))
+        lines.append(f"{self.frames} frames in {self.elapsed:.2f}s, {self.throughput:.1f} frames/s")
+        return "\n".join(lines)
+
+
+def _probe_frame(card: RelayCard, stats: AddressStats, com_code: ComCodes, clock: Callable[[], float]) -> None:
+    sent = clock()
+    try:
+        response = card.send_once(com_code.command_code, stats.address)
+    except ResponseCRCError:
+        stats.crc_errors += 1
+    except ResponseTimeoutError:
+        stats.timeouts += 1
+    except RelayCardError:
+        stats.errors += 1
+    else:
+        if response.command == com_code.response_code:
+            stats.latencies.append(clock() - sent)
+        else:
+            stats.errors += 1
+
+
+def probe(
+    card: RelayCard,
+    commands: list[str] | None = None,
+    count: int | None = None,
+    duration: float | None = None,
+    clock: Callable[[], float] = time.perf_counter,
+) -> ProbeResult:
+    """
+    Send non-destructive frames to every card address in turn and collect stats.
+
+    Commands are cycled per address (e.g. ["getport", "getport", "noop"]). The
+    probe stops after count frames per address or once duration seconds passed,
+    whichever comes first. The deadline is checked before every frame, so the
+    last round may cover only part of the addresses. Frames are sent once
+    without retries so errors show up in the stats.
+    """
+    if not card.is_initialized:
+        raise RelayCardError("Initialize serial connection before probing")
+
+    com_codes = [PROBE_COMMANDS[command] for command in commands or ["getport", "noop"]]
+    if count is None and duration is None:
+        count = 100
+
+    addresses = {address: AddressStats(address) for address in range(1, card.card_count + 1)}
+    start = clock()
+    deadline = start + duration if duration is not None else None
+
+    for i in range(count) if count is not None else counter():
+        for stats in addresses.values():
+            if deadline is not None and clock() >= deadline:
+                return ProbeResult(addresses, clock() - start)
+            _probe_frame(card, stats, com_codes[i % len(com_codes)], clock)
+
+    return ProbeResult(addresses, clock() - start)
@@ -2,7 +2,9 @@ from unittest import mock
 
 import pytest
 
-from conrad_relaycard import RelayCard, RelayCardError, RelayState
+from conrad_relaycard import ChainState, RelayCard, RelayCardError, RelayOptions, RelayState, StateJournal
+from conrad_relaycard.constants import ComCodes, CommandCodes
+from conrad_relaycard.frame import RequestFrame, ResponseFrame
 
 
 def test_relaycard() -> None:
@@ -103,3 +105,223 @@ def test_relaycard_internal() -> None:
         rly = RelayCard("COM3")
         with pytest.raises(RelayCardError, match="Initialize serial connection before sending"):
             rly._send_frame(0)
+
+
+def test_relaycard_options() -> None:
+    with mock.patch("serial.Serial") as mock_serial:
+        mock_serial_instance = mock_serial.return_value
+        mock_serial_instance.is_open = True
+        mock_serial_instance.in_waiting = 4
+        mock_serial_instance.read.return_value = b"\x01\x04\x00\x00"
+        mock_serial_instance.write.return_value = 4
+
+        rly = RelayCard("COM3")
+        assert rly.setup() is True
+        assert rly.card_count == 3
+
+        mock_serial_instance.read.return_value = b"\xfb\x00\x01\xfa"
+        assert rly.get_options(1) == RelayOptions(broadcast_disabled=True)
+
+        # cached, no frame sent
+        mock_serial_instance.read.reset_mock()
+        assert rly.get_options(1) == RelayOptions(broadcast_disabled=True)
+        mock_serial_instance.read.assert_not_called()
+
+        mock_serial_instance.read.return_value = b"\xfa\x00\x00\xfa"
+        assert rly.set_options(1, RelayOptions()) == RelayOptions()
+        assert rly.get_options(1) == RelayOptions()
+
+        # card 2 blocks forwarding, card 3 never sees a broadcast
+        mock_serial_instance.read.side_effect = [b"\xfb\x00\x02\xf9", b"\xfb\x00\x00\xfb"]
+        assert rly.broadcast_receivers().tolist() == [True, True, False]
+
+        mock_serial_instance.read.side_effect = None
+        frames = rly.plan_frames(ChainState(3), ChainState(3, [255, 255, 255]))
+        assert [(f.address, f.data) for f in frames] == [(0, 255), (3, 255)]
+
+        with pytest.raises(RelayCardError, match="Wrong card count 2"):
+            rly.plan_frames(ChainState(2), ChainState(2))
+
+        # setup drops cached options
+        mock_serial_instance.read.return_value = b"\x01\x04\x00\x00"
+        assert rly.setup() is True
+        mock_serial_instance.read.return_value = b"\xfb\x00\x03\xf8"
+        assert rly.get_options(1) == RelayOptions(broadcast_disabled=True, broadcast_blocked=True)
+
+
+def test_relaycard_journal(tmp_path) -> None:
+    with mock.patch("serial.Serial") as mock_serial:
+        mock_serial_instance = mock_serial.return_value
+        mock_serial_instance.is_open = True
+        mock_serial_instance.in_waiting = 4
+        mock_serial_instance.read.return_value = b"\x01\x04\x00\x00"
+        mock_serial_instance.write.return_value = 4
+
+        journal = StateJournal(str(tmp_path / "states.journal"))
+        rly = RelayCard("COM3", journal=journal)
+        assert rly.setup() is True
+
+        mock_serial_instance.read.return_value = b"\xfc\x00\x05\xf9"
+        assert rly.set_ports(1, RelayState(5)).to_byte() == 5
+        mock_serial_instance.read.return_value = b"\xf7\x00\x01\xf6"
+        assert rly.toggle_port(2, 0).to_byte() == 1
+        assert journal.get_state(1).to_byte() == 5
+        assert journal.get_state(2).to_byte() == 1
+
+        # card 1 answers all relays off, the journaled state is applied again
+        mock_serial_instance.read.side_effect = [b"\xfd\x00\x00\xfd", b"\xfc\x00\x05\xf9"]
+        assert rly.get_ports(1).to_byte() == 5
+        assert mock_serial_instance.write.call_args.args[0] == RequestFrame(CommandCodes.SETPORT, 1, 5).to_bytes()
+
+        # card count changed during setup, only card 2 lost its state
+        mock_serial_instance.read.side_effect = None
+        mock_serial_instance.read.return_value = b"\x01\x03\x00\x00"
+        with mock.patch.object(rly, "_execute_retry") as execute_retry:
+            execute_retry.side_effect = [
+                ResponseFrame(b"\xfd\x00\x05\xf8"),
+                ResponseFrame(b"\xfd\x00\x00\xfd"),
+                ResponseFrame(b"\xfc\x00\x01\xfd"),
+            ]
+            assert rly.setup() is True
+            assert rly.card_count == 2
+            assert execute_retry.call_args_list[-1] == mock.call(ComCodes.SETPORT, 2, 1)
+            assert execute_retry.call_count == 3
+
+        rly.journal = None
+        assert rly.restore() == []
+
+
+def test_relaycard_broadcast() -> None:
+    with mock.patch("serial.Serial") as mock_serial:
+        mock_serial_instance = mock_serial.return_value
+        mock_serial_instance.is_open = True
+        mock_serial_instance.in_waiting = 4
+        mock_serial_instance.read.return_value = b"\x01\x04\x00\x00"
+        mock_serial_instance.write.return_value = 4
+
+        rly = RelayCard("COM3")
+        assert rly.setup() is True
+
+        # written options are cached, whatever the card answers
+        mock_serial_instance.read.return_value = b"\xfa\x00\x00\xfa"
+        assert rly.set_options(3, RelayOptions(broadcast_disabled=True)) == RelayOptions(broadcast_disabled=True)
+        mock_serial_instance.read.side_effect = [b"\xfb\x00\x00\xfb", b"\xfb\x00\x00\xfb"]
+        frames = rly.plan_frames(ChainState(3), ChainState(3, [255, 255, 255]))
+        assert [(f.address, f.data) for f in frames] == [(0, 255), (3, 255)]
+
+        # the broadcast comes back unchanged, card 3 gets its own SETPORT
+        mock_serial_instance.write.reset_mock()
+        mock_serial_instance.read.side_effect = [b"\x08\x00\xff\xf7", b"\xfc\x00\xff\x03"]
+        rly.apply_frames(frames)
+        assert [c.args[0] for c in mock_serial_instance.write.call_args_list] == [
+            b"\x08\x00\xff\xf7",
+            b"\x03\x03\xff\xff",
+        ]
+
+        # a blocked broadcast does not come back at all
+        mock_serial_instance.read.side_effect = [b""]
+        rly.send_broadcast(CommandCodes.TOGGLE, 1)
+
+        mock_serial_instance.read.side_effect = [b"\xfc\x00\xff\x03"]
+        with pytest.raises(RelayCardError, match="Wrong broadcast echo"):
+            rly.send_broadcast(CommandCodes.SETPORT, 255)
+        with pytest.raises(RelayCardError, match="Wrong broadcast command"):
+            rly.send_broadcast(CommandCodes.SETUP)
+
+
+def test_relaycard_journal_intent(tmp_path) -> None:
+    with mock.patch("serial.Serial") as mock_serial:
+        mock_serial_instance = mock_serial.return_value
+        mock_serial_instance.is_open = True
+        mock_serial_instance.in_waiting = 4
+        mock_serial_instance.read.return_value = b"\x01\x04\x00\x00"
+        mock_serial_instance.write.return_value = 4
+        mock_serial_instance.close.side_effect = lambda: setattr(mock_serial_instance, "is_open", False)
+        mock_serial_instance.open.side_effect = lambda: setattr(mock_serial_instance, "is_open", True)
+
+        journal = StateJournal(str(tmp_path / "states.journal"))
+        journal.record(1, RelayState(0x0F))
+        rly = RelayCard("COM3", journal=journal)
+        assert rly.setup() is True
+
+        # card 1 just reset, its replies only show the single new port
+        mock_serial_instance.read.return_value = b"\xf9\x00\x80\x79"
+        assert rly.set_port(1, 7, True).to_byte() == 0x80
+        assert journal.get_state(1).to_byte() == 0x8F
+
+        mock_serial_instance.read.return_value = b"\xf7\x00\x81\x76"
+        assert rly.toggle_ports(1, RelayState(1)).to_byte() == 0x81
+        assert journal.get_state(1).to_byte() == 0x8E
+
+        mock_serial_instance.read.return_value = b"\xf8\x00\x01\xf9"
+        assert rly.set_port(1, 7, False).to_byte() == 0x01
+        assert journal.get_state(1).to_byte() == 0x0E
+
+        mock_serial_instance.read.return_value = b"\xfc\x00\x00\xfc"
+        assert rly.set_ports(1, RelayState(3)).to_byte() == 0
+        assert journal.get_state(1).to_byte() == 3
+
+        # nothing journaled for card 2, the reply is recorded
+        mock_serial_instance.read.return_value = b"\xf9\x00\x04\xfd"
+        rly.set_port(2, 2, True)
+        assert journal.get_state(2).to_byte() == 4
+
+        # a failing restore does not turn a good read into an error
+        mock_serial_instance.read.side_effect = [b"\xfd\x00\x00\xfd"] + [b"\xfd\x00\x00\xfd"] * 3
+        assert rly.get_ports(1).to_byte() == 0
+        assert journal.get_state(1).to_byte() == 3
+        mock_serial_instance.read.side_effect = [b"\xfd\x00\x04\xf9"]
+        assert rly.get_ports(2).to_byte() == 4
+
+        # a failing restore after a card count change does not fail setup
+        mock_serial_instance.read.side_effect = [b"\x01\x03\x00\x00"] + [b""] * 3
+        assert rly.setup() is True
+        assert rly.card_count == 2
+        assert mock_serial_instance.is_open is True
+        mock_serial_instance.read.side_effect = [b"\x01\x04\x00\x00", b"\xfd\x00\x03\xfe", b"\xfd\x00\x04\xf9"]
+        assert rly.setup() is True
+
+        # a broadcast is journaled for every card acting on it
+        mock_serial_instance.read.side_effect = [b"\xfb\x00\x00\xfb", b"\xfb\x00\x02\xf9", b"\xfb\x00\x00\xfb"]
+        rly.load_options()
+        mock_serial_instance.read.side_effect = [b"\x08\x00\x10\x18", b"\xfc\x00\x20\xdc"]
+        rly.apply_frames([RequestFrame(CommandCodes.TOGGLE, 0, 0x10), RequestFrame(CommandCodes.SETPORT, 3, 0x20)])
+        assert {address: state.to_byte() for address, state in journal.states().items()} == {1: 0x13, 2: 0x14, 3: 0x20}
+
+
+def test_relaycard_apply_frames_options() -> None:
+    with mock.patch("serial.Serial") as mock_serial:
+        mock_serial_instance = mock_serial.return_value
+        mock_serial_instance.is_open = True
+        mock_serial_instance.in_waiting = 4
+        mock_serial_instance.read.return_value = b"\x01\x03\x00\x00"
+        mock_serial_instance.write.return_value = 4
+
+        rly = RelayCard("COM3")
+        assert rly.setup() is True
+
+        # options are read once, before any relay is switched
+        mock_serial_instance.write.reset_mock()
+        mock_serial_instance.read.side_effect = [
+            b"\xfb\x00\x00\xfb",
+            b"\xfb\x00\x00\xfb",
+            b"\x08\x00\x01\x09",
+            b"\x08\x00\x02\x0a",
+        ]
+        rly.apply_frames([RequestFrame(CommandCodes.TOGGLE, 0, 1), RequestFrame(CommandCodes.TOGGLE, 0, 2)])
+        assert [c.args[0][0] for c in mock_serial_instance.write.call_args_list] == [
+            CommandCodes.GETOPTION,
+            CommandCodes.GETOPTION,
+            CommandCodes.TOGGLE,
+            CommandCodes.TOGGLE,
+        ]
+
+        # a failing GETOPTION leaves every relay untouched
+        mock_serial_instance.read.side_effect = None
+        mock_serial_instance.read.return_value = b"\x01\x03\x00\x00"
+        assert rly.setup() is True
+        mock_serial_instance.write.reset_mock()
+        mock_serial_instance.read.return_value = b""
+        with pytest.raises(RelayCardError, match="Retry #3"):
+            rly.apply_frames([RequestFrame(CommandCodes.TOGGLE, 0, 1)])
+        assert CommandCodes.TOGGLE not in [c.args[0][0] for c in mock_serial_instance.write.call_args_list]
@@ -0,0 +1,123 @@
+import numpy as np
+import pytest
+
+from conrad_relaycard import ChainState, RelayState
+from conrad_relaycard.constants import CommandCodes
+from conrad_relaycard.exceptions import RelayCardError
+
+
+def test_chainstate():
+    chain = ChainState(3, [0, 128, 255])
+    assert len(chain) == 3
+    assert repr(chain) == "<ChainState cards:3 state:0080ff>"
+    assert chain.get_state(2).to_byte() == RelayState(128).to_byte()
+    assert chain.ports.shape == (3, 8)
+    assert chain.ports[1].tolist() == [False] * 7 + [True]
+    assert ChainState.from_ports(chain.ports) == chain
+
+    chain.set_state(1, RelayState(3))
+    assert chain.to_bytes() == b"\x03\x80\xff"
+    assert ChainState.from_bytes(chain.to_bytes()) == chain
+    assert chain.copy() == chain
+    assert chain.copy() is not chain
+
+
+def test_chainstate_mask():
+    chain = ChainState(3, [0, 128, 255])
+    assert chain.get_ports([1, 128, 2]).sum(axis=1).tolist() == [0, 1, 1]
+
+    chain.set_ports([1, 1, 1], True)
+    assert chain.to_bytes() == b"\x01\x81\xff"
+
+    mask = np.zeros((3, 8), dtype=bool)
+    mask[:, 7] = True
+    chain.set_ports(mask, False)
+    assert chain.to_bytes() == b"\x01\x01\x7f"
+
+
+def test_chainstate_diff():
+    chain = ChainState(3, [0, 128, 255])
+    target = ChainState(3, [0, 129, 0])
+    assert chain.diff(target).tolist() == [0, 1, 255]
+    assert chain.changed_addresses(target).tolist() == [2, 3]
+
+
+def test_chainstate_to_frames():
+    chain = ChainState(4, [0, 1, 2, 3])
+    assert chain.to_frames(chain) == []
+
+    frames = chain.to_frames(ChainState(4, [0, 1, 2, 4]))
+    assert [f.to_bytes() for f in frames] == [b"\x03\x04\x04\x03"]
+
+    # every card ends up the same, one broadcast SETPORT is enough
+    frames = chain.to_frames(ChainState(4, [255, 255, 255, 255]))
+    assert len(frames) == 1
+    assert (frames[0].command, frames[0].address, frames[0].data) == (CommandCodes.SETPORT, 0, 255)
+
+    # every card flips the same port, broadcast TOGGLE plus one fix up
+    frames = chain.to_frames(ChainState(4, [16, 17, 18, 0]))
+    assert [(f.command, f.address, f.data) for f in frames] == [
+        (CommandCodes.TOGGLE, 0, 16),
+        (CommandCodes.SETPORT, 4, 0),
+    ]
+
+    # every card switches port 0 on, one broadcast SETSINGLE is enough
+    chain = ChainState(4, [0, 3, 4, 7])
+    frames = chain.to_frames(ChainState(4, [1, 3, 5, 7]))
+    assert [(f.command, f.address, f.data) for f in frames] == [(CommandCodes.SETSINGLE, 0, 1)]
+
+    # port 1 goes off wherever it is on, one broadcast DELSINGLE is enough
+    chain = ChainState(4, [2, 1, 6, 0])
+    frames = chain.to_frames(ChainState(4, [0, 1, 4, 0]))
+    assert [(f.command, f.address, f.data) for f in frames] == [(CommandCodes.DELSINGLE, 0, 0xFA)]
+
+    frames = chain.to_frames(ChainState(4, [255, 255, 255, 255]), broadcast=False)
+    assert [f.address for f in frames] == [1, 2, 3, 4]
+
+
+def test_chainstate_error():
+    with pytest.raises(RelayCardError, match="Wrong card count 0"):
+        ChainState(0)
+    with pytest.raises(RelayCardError, match="Wrong chain state length"):
+        ChainState(2, b"\x00")
+    with pytest.raises(RelayCardError, match="Wrong chain state"):
+        ChainState(1, [256])
+    with pytest.raises(RelayCardError, match="Wrong chain state dtype float64. Expected integer"):
+        ChainState(2, [1.9, 2.2])
+
+    chain = ChainState(2)
+    with pytest.raises(RelayCardError, match="Wrong relay address 3"):
+        chain.get_state(3)
+    with pytest.raises(RelayCardError, match="Wrong relay address 0"):
+        chain.set_state(0, RelayState(0))
+    with pytest.raises(RelayCardError, match=r"Wrong mask int64 \(3,\)\. Expected integer \(2,\) or bool \(2, 8\)"):
+        chain.set_ports(np.array([1, 1, 1], dtype=np.int64), True)
+    with pytest.raises(RelayCardError, match=r"Wrong mask bool \(2,\)"):
+        chain.set_ports([True, False], True)
+    with pytest.raises(RelayCardError, match="Wrong mask dtype float64"):
+        chain.set_ports([1.5, 1.0], True)
+    with pytest.raises(RelayCardError, match="Wrong mask"):
+        chain.get_ports([1, 300])
+    with pytest.raises(RelayCardError, match="Wrong ports shape"):
+        ChainState.from_ports([[True] * 7])
+    with pytest.raises(RelayCardError, match="Wrong card count 3"):
+        chain.diff(ChainState(3))
+
+
+def test_chainstate_to_frames_receivers():
+    chain = ChainState(4, [0, 1, 2, 3])
+    target = ChainState(4, [255, 255, 255, 255])
+
+    # card 4 ignores broadcasts and needs its own frame
+    frames = chain.to_frames(target, broadcast=[True, True, True, False])
+    assert [(f.command, f.address, f.data) for f in frames] == [
+        (CommandCodes.SETPORT, 0, 255),
+        (CommandCodes.SETPORT, 4, 255),
+    ]
+
+    # a broadcast reaching a single card saves nothing
+    frames = chain.to_frames(target, broadcast=[True, False, False, False])
+    assert [f.address for f in frames] == [1, 2, 3, 4]
+
+    with pytest.raises(RelayCardError, match="Wrong broadcast shape"):
+        chain.to_frames(target, broadcast=[True, False])
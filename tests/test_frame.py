@@ -1,7 +1,7 @@
 import pytest
 
 from conrad_relaycard.constants import CommandCodes, ResponseCodes
-from conrad_relaycard.exceptions import RelayCardError
+from conrad_relaycard.exceptions import RelayCardError, ResponseCRCError, ResponseTimeoutError
 from conrad_relaycard.frame import RequestFrame, ResponseFrame
 
 
@@ -35,7 +35,10 @@ def test_responseframe():
 def test_responseframe_error():
     with pytest.raises(RelayCardError, match="Wrong response 100"):
         ResponseFrame([100, 1, 1, 255])
-    with pytest.raises(RelayCardError, match="Wrong responce CRC"):
+    with pytest.raises(ResponseCRCError, match="Wrong responce CRC"):
         ResponseFrame([ResponseCodes.NOOP, 0, 1, 255])
-    with pytest.raises(RelayCardError, match="Wrong response length"):
+    with pytest.raises(ResponseTimeoutError, match="Wrong response length"):
+        ResponseFrame([ResponseCodes.NOOP, 0])
+    with pytest.raises(RelayCardError, match="Wrong response length") as excinfo:
         ResponseFrame([ResponseCodes.NOOP, 0, 1, 255, "extra"])
+    assert not isinstance(excinfo.value, ResponseTimeoutError)
@@ -0,0 +1,63 @@
+import pytest
+
+from conrad_relaycard.exceptions import RelayCardError
+from conrad_relaycard.journal import StateJournal
+from conrad_relaycard.state import RelayState
+
+
+def test_statejournal(tmp_path):
+    path = str(tmp_path / "states.journal")
+    journal = StateJournal(path, compact_every=3)
+    assert journal.get_state(1) is None
+    assert repr(journal) == f"<StateJournal {path} addresses:0>"
+
+    journal.record(1, RelayState(3))
+    journal.record(2, RelayState(4))
+    # unchanged states are not appended
+    journal.record(2, RelayState(4))
+    with open(path, "rb") as journal_file:
+        assert journal_file.read() == b"\x01\x03\x02\x04"
+
+    journal.record(1, RelayState(5))
+    with open(path, "rb") as journal_file:
+        assert journal_file.read() == b"\x01\x05\x02\x04"
+
+    journal.record(2, RelayState(0))
+    journal = StateJournal(path)
+    assert journal.get_state(1).to_byte() == 5
+    assert {address: state.to_byte() for address, state in journal.states().items()} == {1: 5, 2: 0}
+
+
+def test_statejournal_incomplete(tmp_path):
+    path = tmp_path / "states.journal"
+    path.write_bytes(b"\x01\x03\x01\x07\x02")
+
+    journal = StateJournal(str(path))
+    assert journal.get_state(1).to_byte() == 7
+    assert journal.get_state(2) is None
+
+
+def test_statejournal_error(tmp_path):
+    with pytest.raises(RelayCardError, match="Wrong compact interval 0"):
+        StateJournal(str(tmp_path / "states.journal"), compact_every=0)
+
+    path = tmp_path / "broken.journal"
+    path.write_bytes(b"\x00\x03")
+    with pytest.raises(RelayCardError, match="Wrong address 0 in journal"):
+        StateJournal(str(path))
+
+    journal = StateJournal(str(tmp_path / "states.journal"))
+    with pytest.raises(RelayCardError, match="Wrong relay address 256"):
+        journal.record(256, RelayState(0))
+
+
+def test_statejournal_incomplete_append(tmp_path):
+    path = tmp_path / "states.journal"
+    path.write_bytes(b"\x01\x03\x02")
+
+    journal = StateJournal(str(path))
+    journal.record(1, RelayState(5))
+    assert path.read_bytes() == b"\x01\x03\x01\x05"
+
+    journal = StateJournal(str(path))
+    assert {address: state.to_byte() for address, state in journal.states().items()} == {1: 5}
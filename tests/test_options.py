@@ -0,0 +1,17 @@
+import pytest
+
+from conrad_relaycard.exceptions import RelayCardError
+from conrad_relaycard.options import RelayOptions
+
+
+def test_relayoptions():
+    assert RelayOptions.from_byte(0) == RelayOptions()
+    assert RelayOptions.from_byte(1) == RelayOptions(broadcast_disabled=True)
+    assert RelayOptions.from_byte(2) == RelayOptions(broadcast_blocked=True)
+    assert RelayOptions.from_byte(3).to_byte() == 3
+    assert RelayOptions(broadcast_blocked=True).to_byte() == 2
+
+
+def test_relayoptions_error():
+    with pytest.raises(RelayCardError, match="Wrong options 256"):
+        RelayOptions.from_byte(256)
@@ -0,0 +1,110 @@
+import json
+from itertools import count
+from unittest import mock
+
+import pytest
+
+from conrad_relaycard import RelayCard, RelayCardError
+from conrad_relaycard.constants import CommandCodes
+from conrad_relaycard.probe import probe
+
+
+def test_probe():
+    with mock.patch("serial.Serial") as mock_serial:
+        mock_serial_instance = mock_serial.return_value
+        mock_serial_instance.is_open = True
+        mock_serial_instance.in_waiting = 4
+        mock_serial_instance.read.return_value = b"\x01\x03\x00\x00"
+        mock_serial_instance.write.return_value = 4
+
+        rly = RelayCard("COM3")
+        assert rly.setup() is True
+        assert rly.card_count == 2
+
+        mock_serial_instance.read.return_value = None
+        mock_serial_instance.read.side_effect = [
+            b"\xfd\x00\x00\xfd",  # card 1 getport
+            b"\xfd\x00\x00\xfc",  # card 2 getport, wrong crc
+            b"\xff\x00\x00\xff",  # card 1 noop
+            b"\xff\x00",  # card 2 noop, timeout
+            b"\xff\x00\x00\xff",  # card 1 getport, wrong response
+            b"\xfd\x00\x00\xfd",  # card 2 getport
+        ]
+
+        # every clock call advances by one millisecond
+        ticks = count()
+        result = probe(rly, count=3, clock=lambda: next(ticks) / 1000)
+
+        card1, card2 = result.addresses[1], result.addresses[2]
+        assert (card1.frames, len(card1.latencies), card1.errors) == (3, 2, 1)
+        assert (card2.frames, len(card2.latencies), card2.crc_errors, card2.timeouts) == (3, 1, 1, 1)
+        assert card1.percentiles() == {50: 1.0, 90: 1.0, 99: 1.0}
+        assert result.frames == 6
+        assert result.throughput == pytest.approx(6 / result.elapsed)
+
+        data = json.loads(result.to_json())
+        assert data["frames"] == 6
+        assert data["addresses"][1]["crc_errors"] == 1
+        assert data["addresses"][1]["latency_ms"] == {"p50": 1.0, "p90": 1.0, "p99": 1.0}
+
+        table = result.to_table().splitlines()
+        assert table[0].split() == ["addr", "frames", "p50", "ms", "p90", "ms", "p99", "ms", "crc", "timeout", "error"]
+        assert table[1].split() == ["1", "3", "1.00", "1.00", "1.00", "0", "0", "1"]
+        assert table[-1].startswith("6 frames in")
+
+
+def test_probe_duration():
+    with mock.patch("serial.Serial") as mock_serial:
+        mock_serial_instance = mock_serial.return_value
+        mock_serial_instance.is_open = True
+        mock_serial_instance.read.return_value = b"\xff\x00\x00\xff"
+        mock_serial_instance.write.return_value = 4
+
+        rly = RelayCard("COM3")
+        rly.card_count = 1
+
+        ticks = count()
+        result = probe(rly, commands=["noop"], duration=0.005, clock=lambda: next(ticks) / 1000)
+        assert result.addresses[1].frames == 2
+        assert result.addresses[1].percentiles() == {50: 1.0, 90: 1.0, 99: 1.0}
+
+        # the deadline is checked before every frame, not only per round
+        rly.card_count = 3
+        ticks = count()
+        result = probe(rly, commands=["noop"], duration=0.006, clock=lambda: next(ticks) / 1000)
+        assert [stats.frames for stats in result.addresses.values()] == [1, 1, 0]
+        assert result.to_table().splitlines()[3].split()[:2] == ["3", "0"]
+
+        result = probe(rly, commands=["noop"], count=0)
+        assert result.frames == 0
+        assert result.throughput == 0.0
+        assert result.addresses[1].percentiles() == {}
+        assert result.to_table().splitlines()[1].split() == ["1", "0", "-", "-", "-", "0", "0", "0"]
+
+
+def test_probe_error():
+    rly = RelayCard("COM3")
+    with pytest.raises(RelayCardError, match="Initialize serial connection before probing"):
+        probe(rly)
+
+
+def test_probe_keeps_port_open():
+    with mock.patch("serial.Serial") as mock_serial:
+        mock_serial_instance = mock_serial.return_value
+        mock_serial_instance.is_open = True
+        mock_serial_instance.close.side_effect = lambda: setattr(mock_serial_instance, "is_open", False)
+        mock_serial_instance.read.return_value = b"\xfd\x00\x00\xfd"
+        # the first frame is not written completely
+        mock_serial_instance.write.side_effect = [3, 4, 4, 4]
+
+        rly = RelayCard("COM3")
+        rly.card_count = 2
+
+        result = probe(rly, commands=["getport"], count=2)
+        assert [stats.errors for stats in result.addresses.values()] == [1, 0]
+        assert [len(stats.latencies) for stats in result.addresses.values()] == [1, 2]
+        assert mock_serial_instance.is_open is True
+
+        with pytest.raises(RelayCardError, match="Wrong relay address 3"):
+            rly.send_once(CommandCodes.GETPORT, 3)
+        assert mock_serial_instance.is_open is True